@@ -101,7 +101,7 @@ def init_notebook(locality: str):
       warnings.formatwarning = custom_formatwarning
 
 
-def load_settings(settings_file: str = "in/settings.json", settings_object: dict = None):
+def load_settings(settings_file: str = "in/settings.json", settings_object: dict = None, compiled_file: str = None):
    """
    Load and return the settings dictionary for the locality.
 
@@ -112,11 +112,32 @@ def load_settings(settings_file: str = "in/settings.json", settings_object: dict
    :type settings_file: str, optional
    :param settings_object: Optional settings object to use instead of loading from a file.
    :type settings_object: dict, optional
+   :param compiled_file: Optional path to the output of compile_settings(), used instead of resolving the settings file
+      as long as it's up to date with it.
+   :type compiled_file: str, optional
 
    :returns: The settings dictionary.
    :rtype: dict
    """
-   return openavmkit.utilities.settings.load_settings(settings_file, settings_object)
+   return openavmkit.utilities.settings.load_settings(settings_file, settings_object, compiled_file=compiled_file)
+
+
+def compile_settings(settings_file: str = "in/settings.json", compiled_file: str = None):
+   """
+   Fully resolve the settings file once and save the result as JSON.
+
+   Passing the returned path as ``compiled_file`` to load_settings() loads the compiled result directly, until the
+   settings file or the default templates change.
+
+   :param settings_file: Path to the settings file.
+   :type settings_file: str, optional
+   :param compiled_file: Where to write the compiled settings. Defaults to ``<settings_file>.compiled.json``.
+   :type compiled_file: str, optional
+
+   :returns: Path to the compiled settings file.
+   :rtype: str
+   """
+   return openavmkit.utilities.settings.compile_settings(settings_file, compiled_file)
 
 
 def examine_sup_in_ridiculous_detail(sup: SalesUniversePair, s: dict):
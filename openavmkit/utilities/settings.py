@@ -1,4 +1,5 @@
-import importlib
+import functools
+import hashlib
 import json
 import os
 import warnings
@@ -6,9 +7,23 @@ import geopandas as gpd
 
 import pandas as pd
 from datetime import datetime
+from importlib.metadata import version, PackageNotFoundError
+from importlib.resources import files
 
-def load_settings(settings_file: str = "in/settings.json", settings_object: dict = None, error=True):
+try:
+  # orjson parses straight from bytes and is considerably faster; fall back to the standard library if it's missing
+  import orjson
+  _json_loads = orjson.loads
+except ImportError:
+  _json_loads = json.loads
+
+def load_settings(settings_file: str = "in/settings.json", settings_object: dict = None, error=True, compiled_file: str = None):
   if settings_object is None:
+    if compiled_file is not None:
+      # use the output of compile_settings() if it's still up to date with the settings file and templates
+      settings = _load_compiled_settings(settings_file, compiled_file)
+      if settings is not None:
+        return settings
     try:
       with open(settings_file, "r") as f:
         settings = json.load(f)
@@ -25,18 +40,41 @@ def load_settings(settings_file: str = "in/settings.json", settings_object: dict
   else:
     settings = settings_object
 
-  template = _load_settings_template()
-  # merge settings with template; settings will overwrite template values
-  settings = _merge_settings(template, settings)
-  base_dd = {
-    "data_dictionary": _load_data_dictionary_template()
-  }
-  settings = _merge_settings(base_dd, settings)
-  settings = _remove_comments_from_settings(settings)
-  settings = _replace_variables(settings)
+  settings = _build_settings(settings)
   return settings
 
 
+def compile_settings(settings_file: str = "in/settings.json", compiled_file: str = None) -> str:
+  """
+  Fully resolve a settings file and save the result as JSON.
+
+  Passing the returned path as ``compiled_file`` to load_settings() loads the compiled result directly, skipping the
+  template merge and variable replacement, for as long as neither the settings file nor the bundled templates change.
+
+  :param settings_file: Path to the settings file.
+  :type settings_file: str, optional
+  :param compiled_file: Where to write the compiled settings. Defaults to ``<settings_file>.compiled.json``.
+  :type compiled_file: str, optional
+  :returns: Path to the compiled settings file.
+  :rtype: str
+  :raises ValueError: If the resolved settings contain NaN or Infinity, which the compiled format can't represent.
+  """
+  signature = _get_compiled_settings_signature(settings_file)
+  with open(settings_file, "r") as f:
+    settings = json.load(f)
+  settings = _build_settings(settings)
+  if compiled_file is None:
+    compiled_file = f"{settings_file}.compiled.json"
+  # strict JSON only: the compiled file is read back with orjson, which rejects NaN and Infinity. Serialize before
+  # opening the file so a failure doesn't leave a partial compiled file behind
+  data = json.dumps(settings, allow_nan=False)
+  # the signature goes on its own first line, so it can be checked without parsing the settings
+  with open(compiled_file, "w", encoding="utf-8") as file:
+    file.write(json.dumps(signature) + "\n")
+    file.write(data)
+  return compiled_file
+
+
 def get_model_group(s: dict, key: str):
   return s.get("modeling", {}).get("model_groups", {}).get(key, {})
 
@@ -48,12 +86,24 @@ def get_valuation_date(s: dict):
     # return January 1 of this year:
     return datetime(datetime.now().year, 1, 1)
 
-  # process the date from string to datetime using format YYYY-MM-DD:
-  val_date = datetime.strptime(val_date_str, "%Y-%m-%d")
-  return val_date
+  return _parse_valuation_date(val_date_str)
 
 
 def get_center(s: dict, gdf: gpd.GeoDataFrame=None)-> tuple[float, float]:
+  """
+  Get the center of the locality as a (longitude, latitude) pair.
+
+  Uses ``settings.locality.center`` if present. Otherwise falls back to the center of the total bounding box of the
+  provided GeoDataFrame, which is much cheaper than unioning every geometry to find a true centroid and is close enough
+  for centering maps.
+
+  :param s: Settings dictionary.
+  :type s: dict
+  :param gdf: Optional GeoDataFrame to derive the center from.
+  :type gdf: geopandas.GeoDataFrame, optional
+  :returns: (x, y) coordinates of the center.
+  :rtype: tuple[float, float]
+  """
   center : dict | None = s.get("locality", {}).get("center", None)
   if center is not None:
     if "longitude" not in center or "latitude" not in center:
@@ -62,9 +112,9 @@ def get_center(s: dict, gdf: gpd.GeoDataFrame=None)-> tuple[float, float]:
     longitude = center["longitude"]
     return longitude, latitude
   elif gdf is not None:
-    # calculate the center of the gdf
-    centroid = gdf.geometry.unary_union.centroid
-    return centroid.x, centroid.y
+    # calculate the center of the gdf's bounding box
+    minx, miny, maxx, maxy = gdf.total_bounds
+    return (minx + maxx) / 2, (miny + maxy) / 2
   else:
     raise ValueError("Could not find locality.center in settings!")
 
@@ -74,8 +124,7 @@ def get_fields_land(s: dict, df: pd.DataFrame=None):
 
 
 def get_fields_land_as_list(s: dict, df: pd.DataFrame=None):
-  fields = get_fields_land(s, df)
-  return fields.get("categorical", []) + fields.get("numeric", []) + fields.get("boolean", [])
+  return _get_fields_flat(s, "land", df)
 
 
 def get_fields_impr(s: dict, df: pd.DataFrame=None):
@@ -83,8 +132,7 @@ def get_fields_impr(s: dict, df: pd.DataFrame=None):
 
 
 def get_fields_impr_as_list(s: dict, df: pd.DataFrame=None):
-  fields = get_fields_impr(s, df)
-  return fields.get("categorical", []) + fields.get("numeric", []) + fields.get("boolean", [])
+  return _get_fields_flat(s, "impr", df)
 
 
 def get_fields_other(s: dict, df: pd.DataFrame=None):
@@ -92,8 +140,7 @@ def get_fields_other(s: dict, df: pd.DataFrame=None):
 
 
 def get_fields_other_as_list(s: dict, df: pd.DataFrame=None):
-  fields = get_fields_other(s, df)
-  return fields.get("categorical", []) + fields.get("numeric", []) + fields.get("boolean", [])
+  return _get_fields_flat(s, "other", df)
 
 
 def get_fields_date(s: dict, df: pd.DataFrame):
@@ -120,27 +167,16 @@ def get_fields_boolean(s: dict, df: pd.DataFrame = None, types: list[str] = None
   :returns: List of boolean field names.
   :rtype: list[str]
   """
-  if types is None:
-    types = ["land", "impr", "other"]
-  bools = []
-  
+  types = _ordered_field_types(types)
+
   # Determine which boolean field to get based on na_handling
   field_type = "boolean"
   if na_handling == "true":
     field_type = "boolean_na_true"
   elif na_handling == "false":
     field_type = "boolean_na_false"
-  
-  if "land" in types:
-    bools += s.get("field_classification", {}).get("land", {}).get(field_type, [])
-  if "impr" in types:
-    bools += s.get("field_classification", {}).get("impr", {}).get(field_type, [])
-  if "other" in types:
-    bools += s.get("field_classification", {}).get("other", {}).get(field_type, [])
-  
-  if df is not None:
-    bools = [bool for bool in bools if bool in df]
-  return bools
+
+  return _collect_fields(s, types, (field_type,), _column_set(df))
 
 
 def get_fields_boolean_na_true(s: dict, df: pd.DataFrame = None, types: list[str] = None):
@@ -176,47 +212,15 @@ def get_fields_boolean_na_false(s: dict, df: pd.DataFrame = None, types: list[st
 
 
 def get_fields_categorical(s: dict, df: pd.DataFrame = None, include_boolean: bool = True, types: list[str] = None):
-  if types is None:
-    types = ["land", "impr", "other"]
-  cats = []
-  if "land" in types:
-    cats += s.get("field_classification", {}).get("land", {}).get("categorical", [])
-  if "impr" in types:
-    cats += s.get("field_classification", {}).get("impr", {}).get("categorical", [])
-  if "other" in types:
-    cats += s.get("field_classification", {}).get("other", {}).get("categorical", [])
-  if include_boolean:
-    if "land" in types:
-      cats += s.get("field_classification", {}).get("land", {}).get("boolean", [])
-    if "impr" in types:
-      cats += s.get("field_classification", {}).get("impr", {}).get("boolean", [])
-    if "other" in types:
-      cats += s.get("field_classification", {}).get("other", {}).get("boolean", [])
-  if df is not None:
-    cats = [cat for cat in cats if cat in df]
-  return cats
+  types = _ordered_field_types(types)
+  kinds = ("categorical", "boolean") if include_boolean else ("categorical",)
+  return _collect_fields(s, types, kinds, _column_set(df))
 
 
 def get_fields_numeric(s: dict, df: pd.DataFrame = None, include_boolean: bool = False, types: list[str] = None):
-  if types is None:
-    types = ["land", "impr", "other"]
-  nums = []
-  if "land" in types:
-    nums += s.get("field_classification", {}).get("land", {}).get("numeric", [])
-  if "impr" in types:
-    nums += s.get("field_classification", {}).get("impr", {}).get("numeric", [])
-  if "other" in types:
-    nums += s.get("field_classification", {}).get("other", {}).get("numeric", [])
-  if include_boolean:
-    if "land" in types:
-      nums += s.get("field_classification", {}).get("land", {}).get("boolean", [])
-    if "impr" in types:
-      nums += s.get("field_classification", {}).get("impr", {}).get("boolean", [])
-    if "other" in types:
-      nums += s.get("field_classification", {}).get("other", {}).get("boolean", [])
-  if df is not None:
-    nums = [num for num in nums if num in df]
-  return nums
+  types = _ordered_field_types(types)
+  kinds = ("numeric", "boolean") if include_boolean else ("numeric",)
+  return _collect_fields(s, types, kinds, _column_set(df))
 
 
 def get_variable_interactions(entry: dict, settings: dict, df: pd.DataFrame = None):
@@ -242,11 +246,11 @@ def get_data_dictionary(settings: dict):
 
 
 def get_grouped_fields_from_data_dictionary(dd: dict, group: str, types: list[str] = None) -> list[str]:
+  type_set = set(types) if types is not None else None
   result = []
-  for key in dd:
-    entry = dd[key]
-    if group in entry.get("groups", []):
-      if types is None or entry.get("type") in types:
+  for key, entry in dd.items():
+    if group in entry.get("groups", ()):
+      if type_set is None or entry.get("type") in type_set:
         result.append(key)
   return result
 
@@ -262,49 +266,34 @@ def get_model_group_ids(settings: dict, df: pd.DataFrame = None):
 
   if df is not None:
     # If a dataframe is provided, filter out model groups that are not present in the DataFrame
-    model_groups_in_df = df["model_group"].unique()
+    model_groups_in_df = set(df["model_group"].unique().tolist())
     model_group_ids = [key for key in model_groups if key in model_groups_in_df]
   else:
     model_group_ids = [key for key in model_groups]
 
   # Order the model groups according to the preferred order
-  ordered_ids = [key for key in order if key in model_group_ids]
-  unordered_ids = [key for key in model_group_ids if key not in ordered_ids]
-  ordered_ids += unordered_ids
+  model_group_id_set = set(model_group_ids)
+  ordered_ids = [key for key in order if key in model_group_id_set]
+  ordered_id_set = set(ordered_ids)
+  ordered_ids.extend(key for key in model_group_ids if key not in ordered_id_set)
 
   return ordered_ids
 
 
 def get_small_area_unit(settings: dict):
-  base_units = settings.get("locality", {}).get("units", "imperial")
-  if base_units == "imperial":
-    return "sqft"
-  elif base_units == "metric":
-    return "sqm"
+  return _get_units(settings)[0]
 
 
 def get_large_area_unit(settings: dict):
-  base_units = settings.get("locality", {}).get("units", "imperial")
-  if base_units == "imperial":
-    return "acre"
-  elif base_units == "metric":
-    return "ha" #hectare
+  return _get_units(settings)[1]
 
 
 def get_short_distance_unit(settings: dict):
-  base_units = settings.get("locality", {}).get("units", "imperial")
-  if base_units == "imperial":
-    return "ft"
-  elif base_units == "metric":
-    return "m"
+  return _get_units(settings)[2]
 
 
 def get_long_distance_unit(settings: dict):
-  base_units = settings.get("locality", {}).get("units", "imperial")
-  if base_units == "imperial":
-    return "mile"
-  elif base_units == "metric":
-    return "km"
+  return _get_units(settings)[3]
 
 
 # Private
@@ -318,15 +307,11 @@ def _apply_dd_to_df_cols(
 ) -> pd.DataFrame:
   dd = settings.get("data_dictionary", {})
 
-  rename_map = {}
-  for column in df.columns:
-    rename_map[column] = dd.get(column, {}).get(dd_field, column)
+  # only columns with an entry get renamed; df.rename leaves the rest alone
+  rename_map = {column: dd[column][dd_field] for column in df.columns if column in dd and dd_field in dd[column]}
 
   if one_hot_descendants is not None:
-    for ancestor in one_hot_descendants:
-      descendants = one_hot_descendants[ancestor]
-      for descendant in descendants:
-        rename_map[descendant] = dd.get(ancestor, {}).get(dd_field, ancestor) + " = " + descendant[len(ancestor)+1:]
+    rename_map.update(_get_one_hot_rename_map(dd, one_hot_descendants, dd_field))
 
   df = df.rename(columns=rename_map)
   return df
@@ -340,34 +325,163 @@ def apply_dd_to_df_rows(
     dd_field: str = "name"
 ) -> pd.DataFrame:
   dd = settings.get("data_dictionary", {})
+  dd_map = _get_dd_field_map(dd, dd_field)
 
-  df[column] = df[column].map(lambda x: dd.get(x, {}).get(dd_field, x))
+  df[column] = _map_values(df[column], dd_map)
   if one_hot_descendants is not None:
-    one_hot_rename_map = {}
-    for ancestor in one_hot_descendants:
-      descendants = one_hot_descendants[ancestor]
-      for descendant in descendants:
-        one_hot_rename_map[descendant] = dd.get(ancestor, {}).get(dd_field, ancestor) + " = " + descendant[len(ancestor)+1:]
-    df[column] = df[column].map(lambda x: one_hot_rename_map.get(x, x))
+    one_hot_rename_map = _get_one_hot_rename_map(dd, one_hot_descendants, dd_field)
+    df[column] = _map_values(df[column], one_hot_rename_map)
   return df
 
 
+def _map_values(series: pd.Series, mapping: dict) -> pd.Series:
+  # Replace the values found in mapping, leaving all others (and the series' dtype) alone
+  if isinstance(series.dtype, pd.CategoricalDtype):
+    # mapping a categorical only visits its categories, not every row
+    return series.map(lambda x: mapping.get(x, x))
+  mask = series.isin(list(mapping))
+  if not mask.any():
+    return series
+  return series.where(~mask, series.map(mapping))
+
+
+def _get_one_hot_rename_map(dd: dict, one_hot_descendants: dict, dd_field: str) -> dict:
+  # {descendant: "<ancestor's dd_field> = <category>"} for each one-hot encoded descendant
+  rename_map = {}
+  for ancestor, descendants in one_hot_descendants.items():
+    ancestor_name = dd.get(ancestor, {}).get(dd_field, ancestor)
+    for descendant in descendants:
+      rename_map[descendant] = ancestor_name + " = " + descendant[len(ancestor)+1:]
+  return rename_map
+
+
+def _get_dd_field_map(dd: dict, dd_field: str) -> dict:
+  # flatten the data dictionary to {key: entry[dd_field]}, skipping entries that don't define dd_field
+  return {key: entry[dd_field] for key, entry in dd.items() if dd_field in entry}
+
+
+def _collect_fields(s: dict, types: tuple, kinds: tuple, col_set: set = None) -> list[str]:
+  # Gather the fields of each kind (e.g. "categorical") for each type, optionally keeping only those in col_set
+  fc = s.get("field_classification", {})
+  fields = []
+  for kind in kinds:
+    for t in types:
+      tf = fc.get(t)
+      if tf is not None:
+        fields.extend(tf.get(kind, ()))
+  if col_set is not None:
+    fields = [field for field in fields if field in col_set]
+  return fields
+
+
+def _ordered_field_types(types: list[str] | None) -> tuple:
+  # field types are always gathered in land/impr/other order, regardless of the order they were requested in
+  if types is None:
+    return "land", "impr", "other"
+  return tuple(t for t in ("land", "impr", "other") if t in types)
+
+
+def _column_set(df: pd.DataFrame | None) -> set | None:
+  return set(df.columns) if df is not None else None
+
+
 def _get_fields(s: dict, type: str, df: pd.DataFrame = None):
-  cats = s.get("field_classification", {}).get(type, {}).get("categorical", [])
-  nums = s.get("field_classification", {}).get(type, {}).get("numeric", [])
-  bools = s.get("field_classification", {}).get(type, {}).get("boolean", [])
+  types = (type,)
+  col_set = _column_set(df)
+  return {
+    "categorical": _collect_fields(s, types, ("categorical",), col_set),
+    "numeric": _collect_fields(s, types, ("numeric",), col_set),
+    "boolean": _collect_fields(s, types, ("boolean",), col_set)
+  }
 
-  if df is not None:
-    cats = [c for c in cats if c in df]
-    nums = [n for n in nums if n in df]
-    bools = [b for b in bools if b in df]
+
+@functools.lru_cache(maxsize=32)
+def _parse_valuation_date(val_date_str: str):
+  # process the date from string to datetime using format YYYY-MM-DD; fromisoformat alone would also accept other ISO
+  # forms such as "20240101" or "2024-01-01T10:30"
+  if not (len(val_date_str) == 10 and val_date_str[4] == val_date_str[7] == "-"):
+    raise ValueError(f"time data '{val_date_str}' does not match format '%Y-%m-%d'")
+  return datetime.fromisoformat(val_date_str)
+
+
+# (small area, large area, short distance, long distance) for each system of base units
+_UNITS = {
+  "imperial": ("sqft", "acre", "ft", "mile"),
+  "metric": ("sqm", "ha", "m", "km") # ha = hectare
+}
+_NO_UNITS = (None, None, None, None)
+
+
+def _get_units(settings: dict) -> tuple:
+  base_units = settings.get("locality", {}).get("units", "imperial")
+  return _UNITS.get(base_units, _NO_UNITS)
+
+
+def _get_fields_flat(s: dict, type: str, df: pd.DataFrame = None):
+  # same fields as _get_fields, as a single list of categorical, then numeric, then boolean fields
+  return _collect_fields(s, (type,), ("categorical", "numeric", "boolean"), _column_set(df))
+
+
+def _build_settings(settings: dict):
+  template = _load_settings_template()
+  # merge settings with template; settings will overwrite template values
+  settings = _merge_settings(template, settings)
+  base_dd = {
+    "data_dictionary": _load_data_dictionary_template()
+  }
+  settings = _merge_settings(base_dd, settings)
+  settings = _remove_comments_from_settings(settings)
+  settings = _replace_variables(settings)
+  return settings
+
+
+def _get_compiled_settings_signature(settings_file: str):
   return {
-    "categorical": cats,
-    "numeric": nums,
-    "boolean": bools
+    "settings_mtime": os.stat(settings_file).st_mtime_ns,
+    "openavmkit_version": _get_openavmkit_version(),
+    "implementation": _get_implementation_checksum()
   }
 
 
+@functools.lru_cache(maxsize=1)
+def _get_openavmkit_version():
+  try:
+    return version("openavmkit")
+  except PackageNotFoundError:
+    return None
+
+
+@functools.lru_cache(maxsize=1)
+def _get_implementation_checksum():
+  # covers everything that shapes the compiled result: the bundled templates and the code in this module that merges
+  # and resolves them, so upgrading either invalidates previously compiled settings
+  checksum = hashlib.sha256()
+  for name in ["settings.template.json", "data_dictionary.json"]:
+    checksum.update(_read_settings_resource(name))
+  with open(__file__, "rb") as file:
+    checksum.update(file.read())
+  return checksum.hexdigest()
+
+
+def _load_compiled_settings(settings_file: str, compiled_file: str):
+  # Returns the compiled settings, or None if they're missing, out of date, or unreadable
+  try:
+    signature = _get_compiled_settings_signature(settings_file)
+    with open(compiled_file, "rb") as file:
+      compiled_signature = _json_loads(file.readline())
+      if compiled_signature != signature:
+        warnings.warn(f"Compiled settings {compiled_file} are out of date with {settings_file}, loading from source instead. Run compile_settings() to update them.")
+        return None
+      settings = _json_loads(file.read())
+  except Exception as e:
+    warnings.warn(f"Could not load compiled settings {compiled_file}, loading from source instead: {e}")
+    return None
+  if not isinstance(settings, dict):
+    warnings.warn(f"Compiled settings {compiled_file} are invalid, loading from source instead.")
+    return None
+  return settings
+
+
 def _get_base_dir(s: dict):
   slug = s.get("locality", {}).get("slug", None)
   if slug is None:
@@ -376,10 +490,8 @@ def _get_base_dir(s: dict):
 
 
 def _process_settings(settings: dict):
-  s = settings.copy()
-
   # Step 1: remove any and all keys that are prefixed with the string "__":
-  s = _remove_comments_from_settings(s)
+  s = _remove_comments_from_settings(settings)
 
   # Step 2: do variable replacement:
   s = _replace_variables(s)
@@ -389,77 +501,88 @@ def _process_settings(settings: dict):
 
 def _remove_comments_from_settings(s: dict):
   comment_token = "__"
-  keys_to_remove = []
-  for key in s:
-    entry = s[key]
-    if key.startswith(comment_token):
-      keys_to_remove.append(key)
-    elif isinstance(entry, dict):
-      s[key] = _remove_comments_from_settings(entry)
-  for k in keys_to_remove:
-    del s[k]
-  return s
+  return _rewrite_keys(s, lambda key: None if key.startswith(comment_token) else key)
 
 
-def _replace_variables(settings: dict):
+def _rewrite_keys(node: dict | list, rewrite) -> dict | list:
+  # Rename (or drop, if `rewrite` returns None) every dict key in the tree. Inputs are never mutated: only the dicts and
+  # lists along a path to a change are rebuilt, and everything else is shared with the input by reference.
 
-  result = settings.copy()
-  failsafe = 999
-  changes = 1
+  if isinstance(node, dict):
+    changed = False
+    items = []
+    for key, entry in node.items():
+      new_key = rewrite(key)
+      if new_key is None:
+        changed = True
+        continue
+      new_entry = _rewrite_keys(entry, rewrite)
+      if new_key != key or new_entry is not entry:
+        changed = True
+      items.append((new_key, new_entry))
+    return dict(items) if changed else node
 
-  while changes > 0 and failsafe > 0:
-    result, changes = _do_replace_variables(result, settings)
-    failsafe -= 1
+  elif isinstance(node, list):
+    new_entries = [_rewrite_keys(entry, rewrite) for entry in node]
+    if any(new_entry is not entry for new_entry, entry in zip(new_entries, node)):
+      return new_entries
 
-  return result
+  return node
 
 
+def _replace_variables(settings: dict, var_token: str = "$$"):
+  return _resolve(settings, settings, {}, set(), var_token)
 
-def _do_replace_variables(node: dict | list | str,  settings: dict, var_token: str = "$$"):
-  # For each key-value pair, search for values that are strings prefixed with $$, and replace them accordingly
 
-  changes = 0
-  replacement = node
+def _resolve(node: dict | list | str, settings: dict, cache: dict, visiting: set, var_token: str = "$$"):
+  # Replace every string prefixed with $$ with the value it points to, resolving variables that point to other
+  # variables as they are encountered. Resolved variables are memoized in `cache`, and `visiting` holds the chain of
+  # variables currently being resolved so that circular references are caught instead of looping forever.
+  # Like _rewrite_keys, this never mutates its input: only containers with a replacement somewhere below are rebuilt.
 
   if isinstance(node, str):
     # Case 1 -- node is string
-    str_value = str(node)
-    if str_value.startswith(var_token):
-      var_name = str_value[len(var_token):]
-      var_value = _lookup_variable_in_settings(settings, var_name)
-      replacement = var_value
-      if replacement is None:
-        raise ValueError(f"Variable {var_name} not found in settings!")
-      changes += 1
+    if not node.startswith(var_token):
+      return node
+    var_name = node[len(var_token):]
+    if var_name in cache:
+      return cache[var_name]
+    if var_name in visiting:
+      raise ValueError(f"Circular reference detected while resolving variable {var_name}!")
+    var_value = _lookup_variable_in_settings(settings, var_name)
+    if var_value is None:
+      raise ValueError(f"Variable {var_name} not found in settings!")
+    visiting.add(var_name)
+    var_value = _resolve(var_value, settings, cache, visiting, var_token)
+    visiting.remove(var_name)
+    cache[var_name] = var_value
+    return var_value
 
   elif isinstance(node, dict):
     # Case 2 -- node is a dict
-    _replacements = {}
-    for key in node:
-      entry = node[key]
-      replacement, _changes = _do_replace_variables(entry, settings, var_token)
-      if _changes > 0:
-        _replacements[key] = replacement
-        changes += _changes
-    if changes > 0:
-      for key in _replacements:
-        node[key] = _replacements[key]
-    replacement = node
+    result = None
+    for key, entry in node.items():
+      replacement = _resolve(entry, settings, cache, visiting, var_token)
+      if replacement is not entry:
+        if result is None:
+          result = node.copy()
+        result[key] = replacement
+    if result is not None:
+      return result
 
   elif isinstance(node, list):
     # Case 3 -- node is a list. Go through each entry in the list.
-    _replacements = {}
+    result = None
     for i, entry in enumerate(node):
-      replacement, _changes = _do_replace_variables(entry, settings, var_token)
-      if _changes > 0:
-        _replacements[i] = replacement
-        changes += _changes
-    if changes > 0:
-      for i in _replacements:
-        node[i] = _replacements[i]
-    replacement = node
+      replacement = _resolve(entry, settings, cache, visiting, var_token)
+      if replacement is not entry:
+        if result is None:
+          result = node.copy()
+        result[i] = replacement
+    if result is not None:
+      return result
 
-  return replacement, changes
+  return node
 
 
 def _lookup_variable_in_settings(s: dict, var_name: str, path: list[str] = None):
@@ -468,120 +591,121 @@ def _lookup_variable_in_settings(s: dict, var_name: str, path: list[str] = None)
     # split it by periods, if it has any
     path = var_name.split(".")
 
-  if path is not None and len(path) > 0:
-    first_bit = path[0]
-    if first_bit in s:
-      if len(path) == 1:
-        # this is the last bit of the path
-        return s[first_bit]
-      else:
-        return _lookup_variable_in_settings(s[first_bit], "", path[1:])
+  if len(path) == 0:
+    return None
 
-  return None
+  for key in path:
+    # only dicts can be walked into; anything else (e.g. a string, where `in` would match substrings) is a dead end
+    if not isinstance(s, dict) or key not in s:
+      return None
+    s = s[key]
+
+  return s
+
+
+@functools.lru_cache(maxsize=4)
+def _read_settings_resource(name: str):
+  # only the raw bytes are cached; parsing them fresh is cheaper than deep-copying a cached dict, and hands every caller
+  # its own template to merge into
+  return files("openavmkit.resources.settings").joinpath(name).read_bytes()
 
 
 def _load_data_dictionary_template():
-  with importlib.resources.open_text("openavmkit.resources.settings", f"data_dictionary.json", encoding="utf-8") as file:
-    data_dictionary = json.load(file)
-  return data_dictionary
+  return _json_loads(_read_settings_resource("data_dictionary.json"))
 
 
 def _load_settings_template():
-  with importlib.resources.open_text("openavmkit.resources.settings", f"settings.template.json", encoding="utf-8") as file:
-    settings = json.load(file)
-  return settings
+  return _json_loads(_read_settings_resource("settings.template.json"))
 
 
 def is_key_in(object: dict, key: str):
-  flags = ["+", "!"]
-  for flag in ["+", "!", ""]:
-    if f"{flag}{key}" in object:
-      return True, flag
+  # checked in order of precedence: "+key", "!key", then the bare key
+  if "+" + key in object:
+    return True, "+"
+  if "!" + key in object:
+    return True, "!"
+  if key in object:
+    return True, ""
   return False, ""
 
 
 def _strip_flags(settings: dict|list):
-  flags = ["+", "!"]
-
-  if isinstance(settings, list):
-    for i, item in enumerate(settings):
-      if isinstance(item, list) or isinstance(item, dict):
-        settings[i] = _strip_flags(item)
-    return settings
-
-  if isinstance(settings, dict):
-    keys_in_settings = [key for key in settings]
-
-    for key_ in keys_in_settings:
-      if key_ not in settings:
-        continue
-      entry = settings[key_]
-      key = key_
-      for flag in flags:
-        if key_.startswith(flag):
-          key = key_[1:]
-          settings[key] = settings[key_]
-          del settings[key_]
-      if isinstance(entry, dict):
-        entry = _strip_flags(entry)
-        settings[key] = entry
-      elif isinstance(entry, list):
-        for i, item in enumerate(entry):
-          if isinstance(item, list) or isinstance(item, dict):
-            entry[i] = _strip_flags(item)
-      settings[key] = entry
-  return settings
+  flags = ("+", "!")
+  return _rewrite_keys(settings, lambda key: key[1:] if key.startswith(flags) else key)
+
+
+def _merge_unique(entry_t: list, entry_l: list) -> list:
+  # Append the items of entry_l that aren't already in entry_t (or earlier in entry_l) to a copy of entry_t
+  merged = list(entry_t)
+  try:
+    seen = set(merged)
+    new_items = [item for item in dict.fromkeys(entry_l) if item not in seen]
+  except TypeError:
+    # unhashable items (e.g. dicts), fall back to searching the list itself
+    for item in entry_l:
+      if item not in merged:
+        merged.append(item)
+    return merged
+  merged.extend(new_items)
+  return merged
 
 
 def _merge_settings(template: dict, local: dict, indent:str= ""):
-  # Start by copying the template
-  merged = template.copy()
+  # Index the template's keys by their flag-stripped name, so each local key is a single lookup
+  flags = ("+", "!")
+  template_index = {}
+  for key_t in template:
+    if key_t.startswith(flags):
+      template_index[key_t[1:]] = (key_t, key_t[0])
+    else:
+      template_index[key_t] = (key_t, "")
+
+  # Start with the template's entries under their flag-stripped names
+  merged = {key: template[key_t] for key, (key_t, flag) in template_index.items()}
+  merged_recursively = set()
 
   # Iterate over keys of local:
   for key_ in local:
 
     key = key_
     local_stomps = False
+    local_flagged = False
     if key_.startswith("!"):
       local_stomps = True
       key = key_[1:]
+    elif key_.startswith("+"):
+      local_flagged = True
+      key = key_[1:]
 
     entry_l = local[key_]
 
-    key_exists, flag = is_key_in(template, key)
+    key_meta = template_index.get(key)
+    if local_flagged and key_meta is not None and key_meta[0] != key_:
+      # a local "+key" only lines up with a template "+key"; anywhere else it just replaces the entry
+      key_meta = None
 
     # If the key is in both template and local, reconcile them:
-    if key_exists:
-      local_key = f"{flag}{key}"
-      add_template = False
-      if not local_stomps and flag == "+":
-        add_template = True
-
-      if local_stomps:
-        merged[key] = entry_l
+    if key_meta is not None and not local_stomps:
+      key_t, flag = key_meta
+      entry_t = template[key_t]
+      if local_flagged:
+        # a matching "+key" on both sides merges as though neither were flagged
+        flag = ""
+      if isinstance(entry_t, dict) and isinstance(entry_l, dict):
+        # If both are dictionaries, merge them recursively:
+        merged[key] = _merge_settings(entry_t, entry_l, indent + "  ")
+        merged_recursively.add(key)
+      elif isinstance(entry_t, list) and isinstance(entry_l, list) and flag == "+":
+        # If both are lists, add any new local items that aren't already in template:
+        merged[key] = _merge_unique(entry_t, entry_l)
       else:
-        entry_t = template[local_key]
-        if isinstance(entry_t, dict) and isinstance(entry_l, dict):
-          # If both are dictionaries, merge them recursively:
-          merged[key] = _merge_settings(entry_t, entry_l, indent + "  ")
-        elif isinstance(entry_t, list) and isinstance(entry_l, list):
-          if add_template:
-            # If both are lists, add any new local items that aren't already in template:
-            for item in entry_l:
-              if item not in entry_t:
-                entry_t.append(item)
-            merged[key] = entry_t
-          else:
-            merged[key] = entry_l
-        else:
-          merged[key] = entry_l
-
-      if flag != "" and local_key in merged:
-        del merged[local_key]
-
+        merged[key] = entry_l
     else:
       merged[key] = entry_l
 
-  merged = _strip_flags(merged)
+  # Recursive merges come back without flags; strip them from everything else that was carried over as-is
+  for key in merged:
+    if key not in merged_recursively:
+      merged[key] = _strip_flags(merged[key])
 
   return merged
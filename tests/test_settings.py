@@ -1,5 +1,14 @@
 from openavmkit.utilities.settings import _merge_settings, _remove_comments_from_settings, _lookup_variable_in_settings, \
-	_replace_variables
+	_replace_variables, load_settings, get_fields_categorical, get_fields_land, get_model_group_ids, \
+	get_fields_land_as_list, compile_settings, apply_dd_to_df_rows, \
+	get_grouped_fields_from_data_dictionary, get_valuation_date
+import copy
+import json
+import os
+import warnings
+from datetime import datetime
+
+import pandas as pd
 from openavmkit.utilities.assertions import dicts_are_equal, objects_are_equal
 
 
@@ -205,6 +214,12 @@ def test_lookup_variable_in_settings():
 	assert c != c_unexpected, f"Unexpected VS Result:\n{c_unexpected}\n{c}"
 	assert False == dicts_are_equal(d, d_unexpected), f"Unexpected VS Result:\n{d_unexpected}\n{d}"
 
+	# paths that run past a leaf value don't exist, even when the next segment happens to be a substring of it
+	e = _lookup_variable_in_settings(data, "earth.north_america.usa.texas.houston.greenspoint.haystack.needle")
+	f = _lookup_variable_in_settings(data, "mars.rover.cargo.rock")
+	assert e is None, f"Expected VS Result:\nNone\n{e}"
+	assert f is None, f"Expected VS Result:\nNone\n{f}"
+
 
 def test_replace_variables_in_settings():
 
@@ -383,4 +398,305 @@ def test_recursive_replace_variables_in_settings():
 	replaced = _replace_variables(data)
 
 	assert objects_are_equal(replaced, expected), f"Expected VS Result:\n{expected}\n{replaced}"
-	assert not objects_are_equal(data, replaced), f"Unexpected VS Result:\n{data}\n{replaced}"
\ No newline at end of file
+	assert not objects_are_equal(data, replaced), f"Unexpected VS Result:\n{data}\n{replaced}"
+
+
+def test_load_settings_does_not_mutate_template():
+
+	a = load_settings("", {"locality": {"units": "metric"}})
+	a["data_dictionary"].clear()
+	a["locality"]["units"] = "imperial"
+
+	b = load_settings("", {"locality": {"units": "metric"}})
+
+	assert len(b["data_dictionary"]) > 0, "Cached data dictionary template was mutated by a previous load"
+	assert b["locality"]["units"] == "metric", f"Expected VS Result:\nmetric\n{b['locality']['units']}"
+
+
+def test_circular_replace_variables_in_settings():
+
+	data = {
+		"a": "$$b",
+		"b": "$$c",
+		"c": "$$a"
+	}
+
+	error = None
+	try:
+		_replace_variables(data)
+	except ValueError as e:
+		error = e
+
+	assert error is not None, "Expected a circular variable reference to raise a ValueError"
+
+
+def test_get_fields():
+
+	s = {
+		"field_classification": {
+			"land": {
+				"categorical": ["zoning", "land_use"],
+				"numeric": ["land_area_sqft"],
+				"boolean": ["is_corner_lot"]
+			},
+			"impr": {
+				"categorical": ["bldg_type"],
+				"numeric": ["bldg_area_finished_sqft"]
+			}
+		}
+	}
+	df = pd.DataFrame(columns=["zoning", "bldg_type", "land_area_sqft"])
+
+	a = get_fields_categorical(s, df)
+	a.append("garbage")
+	b = get_fields_categorical(s, df)
+	assert b == ["zoning", "bldg_type"], f"Expected VS Result:\n{['zoning', 'bldg_type']}\n{b}"
+
+	c = get_fields_categorical(s, df, include_boolean=True, types=["land"])
+	assert c == ["zoning"], f"Expected VS Result:\n{['zoning']}\n{c}"
+
+	df["is_corner_lot"] = False
+	d = get_fields_land(s, df)
+	expected = {"categorical": ["zoning"], "numeric": ["land_area_sqft"], "boolean": ["is_corner_lot"]}
+	assert d == expected, f"Expected VS Result:\n{expected}\n{d}"
+
+	e = get_fields_land_as_list(s, df)
+	expected = ["zoning", "land_area_sqft", "is_corner_lot"]
+	assert e == expected, f"Expected VS Result:\n{expected}\n{e}"
+
+	# edits to the settings or the DataFrame's columns are reflected by the next lookup
+	s["field_classification"]["impr"]["categorical"].append("bldg_style")
+	f = get_fields_categorical(s, None, include_boolean=False, types=["impr"])
+	assert f == ["bldg_type", "bldg_style"], f"Expected VS Result:\n{['bldg_type', 'bldg_style']}\n{f}"
+	f = get_fields_categorical(s, df, include_boolean=False, types=["impr"])
+	assert f == ["bldg_type"], f"Expected VS Result:\n{['bldg_type']}\n{f}"
+	df["bldg_style"] = "ranch"
+	f = get_fields_categorical(s, df, include_boolean=False, types=["impr"])
+	assert f == ["bldg_type", "bldg_style"], f"Expected VS Result:\n{['bldg_type', 'bldg_style']}\n{f}"
+
+
+def test_get_model_group_ids():
+
+	s = {
+		"modeling": {
+			"model_groups": {"residential_sf": {}, "commercial": {}, "residential_mf": {}, "vacant": {}},
+			"instructions": {"model_group_order": ["vacant", "residential_sf"]}
+		}
+	}
+	df = pd.DataFrame({"model_group": ["commercial", "residential_sf", "vacant", "vacant", "unknown"]})
+
+	ids = get_model_group_ids(s)
+	expected = ["vacant", "residential_sf", "commercial", "residential_mf"]
+	assert ids == expected, f"Expected VS Result:\n{expected}\n{ids}"
+
+	ids = get_model_group_ids(s, df)
+	expected = ["vacant", "residential_sf", "commercial"]
+	assert ids == expected, f"Expected VS Result:\n{expected}\n{ids}"
+
+
+def test_settings_helpers_do_not_mutate_inputs():
+
+	data = {
+		"__comment": "remove me",
+		"+flagged": {"__nested_comment": 1, "!value": "$$untouched.a"},
+		"list": [{"__comment": 2, "b": "$$untouched.a"}],
+		"untouched": {"a": "hello", "b": [1, 2, 3]}
+	}
+	original = copy.deepcopy(data)
+
+	stripped = _remove_comments_from_settings(data)
+	replaced = _replace_variables(stripped)
+	merged = _merge_settings(data, {"list": []})
+
+	assert objects_are_equal(data, original), f"Expected VS Result:\n{original}\n{data}"
+	assert "__comment" not in stripped and "__comment" not in stripped["list"][0]
+	assert replaced["list"][0]["b"] == "hello"
+	assert "flagged" in merged and "value" in merged["flagged"]
+
+	# subtrees without any changes are shared rather than copied
+	assert stripped["untouched"] is data["untouched"]
+	assert replaced["untouched"] is data["untouched"]
+
+
+def test_compile_settings(tmp_path, monkeypatch):
+
+	settings_file = str(tmp_path / "settings.json")
+	with open(settings_file, "w") as f:
+		json.dump({"locality": {"units": "metric"}}, f)
+
+	compiled_file = compile_settings(settings_file)
+	assert os.path.exists(compiled_file)
+
+	compiled = load_settings(settings_file, compiled_file=compiled_file)
+	expected = load_settings("", {"locality": {"units": "metric"}})
+	assert objects_are_equal(compiled, expected), f"Expected VS Result:\n{expected}\n{compiled}"
+
+	# compiled settings are only used when asked for
+	with open(compiled_file, "r", encoding="utf-8") as f:
+		signature_line = f.readline()
+	with open(compiled_file, "w", encoding="utf-8") as f:
+		f.write(signature_line)
+		json.dump({"locality": {"units": "compiled"}}, f)
+	assert load_settings(settings_file)["locality"]["units"] == "metric"
+	assert load_settings(settings_file, compiled_file=compiled_file)["locality"]["units"] == "compiled"
+
+	# editing the settings file invalidates the compiled result
+	with open(settings_file, "w") as f:
+		json.dump({"locality": {"units": "imperial"}}, f)
+	os.utime(settings_file, ns=(0, 0))
+
+	with warnings.catch_warnings(record=True):
+		warnings.simplefilter("always")
+		reloaded = load_settings(settings_file, compiled_file=compiled_file)
+	assert reloaded["locality"]["units"] == "imperial", f"Expected VS Result:\nimperial\n{reloaded['locality']['units']}"
+
+	# a change to the code that builds settings invalidates the compiled result too
+	compile_settings(settings_file, compiled_file)
+	monkeypatch.setattr("openavmkit.utilities.settings._get_implementation_checksum", lambda: "changed")
+	with warnings.catch_warnings(record=True) as caught:
+		warnings.simplefilter("always")
+		load_settings(settings_file, compiled_file=compiled_file)
+	assert any("out of date" in str(w.message) for w in caught), "Expected compiled settings to be out of date"
+	monkeypatch.undo()
+
+	# values the compiled format can't represent fail at compile time rather than when loading
+	nan_file = str(tmp_path / "nan_settings.json")
+	with open(nan_file, "w") as f:
+		f.write('{"locality": {"units": "metric", "radius": NaN}}')
+	error = None
+	try:
+		compile_settings(nan_file)
+	except ValueError as e:
+		error = e
+	assert error is not None, "Expected NaN in the settings to raise a ValueError"
+	assert not os.path.exists(f"{nan_file}.compiled.json"), "Expected no compiled file to be written"
+
+	# unreadable compiled settings fall back to a normal load
+	compile_settings(settings_file, compiled_file)
+	with open(compiled_file, "r", encoding="utf-8") as f:
+		signature_line = f.readline()
+	for contents in ["", "not json\n{}", signature_line + "{broken"]:
+		with open(compiled_file, "w", encoding="utf-8") as f:
+			f.write(contents)
+		with warnings.catch_warnings(record=True):
+			warnings.simplefilter("always")
+			reloaded = load_settings(settings_file, compiled_file=compiled_file)
+		assert reloaded["locality"]["units"] == "imperial", f"Expected VS Result:\nimperial\n{reloaded['locality']['units']}"
+
+
+def test_apply_dd_to_df_rows():
+
+	s = {
+		"data_dictionary": {
+			"land_area_sqft": {"name": "Land area (sqft)"},
+			"bldg_type": {"name": "Building type"},
+			"zoning": {"name": "Zoning"},
+			"no_name": {"description": "Has no name"}
+		}
+	}
+	one_hot_descendants = {"zoning": ["zoning_r1", "zoning_c2"]}
+	df = pd.DataFrame({
+		"Variable": ["land_area_sqft", "bldg_type", "zoning_r1", "no_name", "unknown"],
+		"Count": [1, 2, 3, 4, 5],
+		"Flag": [True, False, True, False, True],
+		"Category": pd.Series(["bldg_type", "other", "bldg_type", "other", "other"], dtype="category")
+	})
+
+	result = apply_dd_to_df_rows(df.copy(), "Variable", s, one_hot_descendants)
+	expected = ["Land area (sqft)", "Building type", "Zoning = r1", "no_name", "unknown"]
+	assert result["Variable"].tolist() == expected, f"Expected VS Result:\n{expected}\n{result['Variable'].tolist()}"
+
+	# non-string and unmatched columns keep their values and dtypes
+	for column in ["Count", "Flag"]:
+		result = apply_dd_to_df_rows(df.copy(), column, s)
+		assert result[column].dtype == df[column].dtype, f"Expected VS Result:\n{df[column].dtype}\n{result[column].dtype}"
+	result = apply_dd_to_df_rows(df.copy(), "Category", s)
+	assert isinstance(result["Category"].dtype, pd.CategoricalDtype), f"Expected VS Result:\ncategory\n{result['Category'].dtype}"
+	expected = ["Building type", "other", "Building type", "other", "other"]
+	assert result["Category"].tolist() == expected, f"Expected VS Result:\n{expected}\n{result['Category'].tolist()}"
+	result = apply_dd_to_df_rows(df.copy(), "Count", s)
+	assert result["Count"].tolist() == [1, 2, 3, 4, 5]
+
+
+def test_merge_local_flags():
+
+	template = {
+		"foo": {"a": 1, "b": 2},
+		"+bar": ["x", "y"]
+	}
+
+	# "!" on the local side stomps the template entry
+	merged = _merge_settings(template, {"!foo": {"a": 9}})
+	assert objects_are_equal(merged["foo"], {"a": 9}), f"Expected VS Result:\n{{'a': 9}}\n{merged['foo']}"
+
+	# a local "+key" with no matching template "+key" replaces the entry
+	merged = _merge_settings(template, {"+foo": {"a": 9}})
+	expected = {"foo": {"a": 9}, "bar": ["x", "y"]}
+	assert dicts_are_equal(merged, expected), f"Expected VS Result:\n{expected}\n{merged}"
+
+	# a local "+key" matching a template "+key" merges dicts recursively and replaces anything else
+	template = {
+		"+fields": {"+land": {"+numeric": ["land_area_sqft"], "categorical": ["zoning"]}},
+		"+bar": ["x", "y"]
+	}
+	merged = _merge_settings(template, {"+fields": {"land": {"numeric": ["my_field"]}}, "+bar": ["z"]})
+	expected = {
+		"fields": {"land": {"numeric": ["land_area_sqft", "my_field"], "categorical": ["zoning"]}},
+		"bar": ["z"]
+	}
+	assert dicts_are_equal(merged, expected), f"Expected VS Result:\n{expected}\n{merged}"
+
+	# the bundled template uses exactly this shape for field_classification
+	settings = load_settings("", {"+field_classification": {"land": {"numeric": ["my_field"]}}})
+	land_numeric = settings["field_classification"]["land"]["numeric"]
+	assert "my_field" in land_numeric and len(land_numeric) > 1, f"Template fields were dropped: {land_numeric}"
+
+
+def test_get_grouped_fields_from_data_dictionary():
+
+	dd = {
+		"sale_price": {"type": "number", "groups": ["sale", "price"]},
+		"sale_date": {"type": "date", "groups": ["sale"]},
+		"land_area_sqft": {"type": "number", "groups": ["land"]},
+		"sale_type": {"type": "string", "groups": ["sale", "sale"]},
+		"key": {"type": "string"}
+	}
+
+	# results follow the data dictionary's order, and duplicate groups don't duplicate keys
+	fields = get_grouped_fields_from_data_dictionary(dd, "sale")
+	expected = ["sale_price", "sale_date", "sale_type"]
+	assert fields == expected, f"Expected VS Result:\n{expected}\n{fields}"
+
+	fields = get_grouped_fields_from_data_dictionary(dd, "sale", types=["number", "date"])
+	expected = ["sale_price", "sale_date"]
+	assert fields == expected, f"Expected VS Result:\n{expected}\n{fields}"
+
+	fields = get_grouped_fields_from_data_dictionary(dd, "missing")
+	assert fields == [], f"Expected VS Result:\n[]\n{fields}"
+
+	# edits to the data dictionary are reflected by the next lookup
+	dd["sale_validity"] = {"type": "boolean", "groups": ["sale"]}
+	fields = get_grouped_fields_from_data_dictionary(dd, "sale", types=["boolean"])
+	assert fields == ["sale_validity"], f"Expected VS Result:\n{['sale_validity']}\n{fields}"
+
+
+def test_get_valuation_date():
+
+	settings = {"modeling": {"metadata": {"valuation_date": "2024-03-15"}}}
+	val_date = get_valuation_date(settings)
+	expected = datetime(2024, 3, 15)
+	assert val_date == expected, f"Expected VS Result:\n{expected}\n{val_date}"
+
+	# defaults to January 1 of the current year
+	val_date = get_valuation_date({})
+	expected = datetime(datetime.now().year, 1, 1)
+	assert val_date == expected, f"Expected VS Result:\n{expected}\n{val_date}"
+
+	# only YYYY-MM-DD is accepted, not the other forms ISO 8601 allows
+	for val_date_str in ["20240101", "2024-W01-1", "2024-01-01T10:30", "2024-1-1", "2024-13-01"]:
+		error = None
+		try:
+			get_valuation_date({"modeling": {"metadata": {"valuation_date": val_date_str}}})
+		except ValueError as e:
+			error = e
+		assert error is not None, f"Expected '{val_date_str}' to raise a ValueError"